@@ -7,10 +7,55 @@ Details about the NDB/CNDB file format can be found at the `Nucleome Data Bank <
 """
 
 import h5py
+import io
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from scipy.spatial import distance
 
+# Numba is optional; traj2HiC falls back to NumPy/SciPy when it is not available
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+# CuPy is optional; it is only required by traj2HiC(use_gpu=True)
+try:
+    import cupy as cp
+    _HAS_CUPY = True
+except ImportError:
+    _HAS_CUPY = False
+
+
+if _HAS_NUMBA:
+    @njit(fastmath=True)
+    def _accum_contact_row(xyz, P, i, mu, rc):
+        R"""
+        Internal function that accumulates the probability of crosslink between bead :code:`i` and the beads :code:`j > i` over all the frames in :code:`xyz`, mirroring row :code:`i` of :code:`P` into its column.
+        """
+        n_frames, n_beads, n_dims = xyz.shape
+        for f in range(n_frames):
+            for j in range(i+1, n_beads):
+                d2 = 0.0
+                for c in range(n_dims):
+                    d2 += (xyz[f, i, c] - xyz[f, j, c])**2
+                P[i, j] += 0.5 * (1.0 + np.tanh(mu * (rc - np.sqrt(d2))))
+        for j in range(i+1, n_beads):
+            P[j, i] = P[i, j]
+
+    @njit(parallel=True, fastmath=True)
+    def _accum_contact(xyz, P, mu, rc):
+        R"""
+        Internal function that accumulates the probability of crosslink of all the frames in :code:`xyz` into the upper and lower triangles of :code:`P`.
+        """
+        n_beads = xyz.shape[1]
+        # row i has n_beads-1-i pairs, so rows k and n_beads-1-k are handled together to give every
+        # parallel iteration the same amount of work
+        for k in prange((n_beads + 1)//2):
+            _accum_contact_row(xyz, P, k, mu, rc)
+            if n_beads - 1 - k != k:
+                _accum_contact_row(xyz, P, n_beads - 1 - k, mu, rc)
 
 
 class cndbTools:
@@ -19,6 +64,16 @@ class cndbTools:
         self.Type_conversion = {'A1':0, 'A2':1, 'B1':2, 'B2':3, 'B3':4, 'B4':5, 'NA':6}
         self.Type_conversionInv = {y:x for x,y in self.Type_conversion.items()}
     
+    @property
+    def ChromSeq(self):
+        R"""
+        Type name of each bead, built on first access from the numeric :code:`ChromSeq_numbers` array.
+        """
+        if self._ChromSeq is None:
+            numbers, inverse = np.unique(self.ChromSeq_numbers, return_inverse=True)
+            self._ChromSeq = np.array([self.Type_conversionInv[t] for t in numbers])[inverse]
+        return self._ChromSeq
+    
     def load(self, filename):
         R"""
         Receives the path to **cndb** or **ndb** file to perform analysis.
@@ -30,20 +85,44 @@ class cndbTools:
         f_name, file_extension = os.path.splitext(filename)
         
         if file_extension == ".ndb":
-            filename = Chrom_utils.ndb2cndb(f_name)   
+            filename = self.ndb2cndb(f_name)   
 
         self.cndb = h5py.File(filename, 'r')
         
-        self.ChromSeq = list(self.cndb['types'])
-        self.uniqueChromSeq = set(self.ChromSeq)
+        types = self.cndb['types'][()]
+        
+        if types.dtype.kind in 'OS':
+            # type names, as stored by MiChroM.initStorage; names without a numeric code get the next free one
+            names, inverse = np.unique(types, return_inverse=True)
+            names = [n.decode() if isinstance(n, bytes) else str(n) for n in names]
+            for name in names:
+                if name not in self.Type_conversion:
+                    self.Type_conversion[name] = len(self.Type_conversion)
+                    self.Type_conversionInv[self.Type_conversion[name]] = name
+            self.ChromSeq_numbers = np.array([self.Type_conversion[n] for n in names], dtype=np.int8)[inverse]
+        else:
+            self.ChromSeq_numbers = np.asarray(types, dtype=np.int8)
+        self._ChromSeq = None
         
-        self.dictChromSeq = {}
+        numbers = np.unique(self.ChromSeq_numbers)
+        self.uniqueChromSeq = {self.Type_conversionInv[t] for t in numbers}
         
-        for tt in self.uniqueChromSeq:
-            self.dictChromSeq[tt] = ([i for i, e in enumerate(self.ChromSeq) if e == tt])
+        self.dictChromSeq = {self.Type_conversionInv[t]: np.where(self.ChromSeq_numbers == t)[0] for t in numbers}
         
-        self.Nbeads = len(self.ChromSeq)
-        self.Nframes = len(self.cndb.keys()) -1
+        self.Nbeads = len(self.ChromSeq_numbers)
+
+        # files storing all frames in a single (Nframes, Nbeads, 3) 'coords' dataset are read with one
+        # hyperslab per xyz() call; otherwise each frame is a dataset keyed by its frame number
+        if 'coords' in self.cndb:
+            self._coords = self.cndb['coords']
+            self.Nframes = self._coords.shape[0]
+        else:
+            self._coords = None
+            frame_keys = [key for key in self.cndb.keys() if key.isdigit()]
+            self.Nframes = len(frame_keys)
+            # xyz() buffers follow the stored precision (float32 for MiChroM trajectories), even for an empty range
+            self._frame_dtype = self.cndb[frame_keys[0]].dtype if len(frame_keys) > 0 else np.float64
+        self._frame_ds = {}
         
         return(self)
     
@@ -61,7 +140,7 @@ class cndbTools:
         Chrom_types     = ['ZA','OA','FB','SB','TB','LB','UN']
         Chrom_types_NDB = ['A1','A2','B1','B2','B3','B4','UN']
         Res_types_PDB   = ['ASP', 'GLU', 'ARG', 'LYS', 'HIS', 'HIS', 'GLY']
-        Type_conversion = {'A1': 0,'A2' : 1,'B1' : 2,'B2' : 3,'B3' : 4,'B4' : 5,'UN' : 6}
+        Type_conversion = {'A1': 0,'A2' : 1,'B1' : 2,'B2' : 3,'B3' : 4,'B4' : 5,'UN' : 6,'NA' : 6}
         title_options = ['HEADER','OBSLTE','TITLE ','SPLT  ','CAVEAT','COMPND','SOURCE','KEYWDS','EXPDTA','NUMMDL','MDLTYP','AUTHOR','REVDAT','SPRSDE','JRNL  ','REMARK']
         model          = "MODEL     {0:4d}"
         atom           = "ATOM  {0:5d} {1:^4s}{2:1s}{3:3s} {4:1s}{5:4d}{6:1s}   {7:8.3f}{8:8.3f}{9:8.3f}{10:6.2f}{11:6.2f}          {12:>2s}{13:2s}"
@@ -70,58 +149,49 @@ class cndbTools:
         file_ndb = filename + str(".ndb")
         name     = filename + str(".cndb")
 
+        with open(file_ndb, "rb") as ndbfile:
+            ndb = ndbfile.read()
+
         cndbf = h5py.File(name, 'w')
-        
-        ndbfile = open(file_ndb, "r")
-        
-        loop = 0
-        types = []
-        types_bool = True
-        loop_list = []
-        x = []
-        y = [] 
-        z = []
 
         frame = 0
-
-        for line in ndbfile:
-
-            entry = line[0:6]
-
-            info = line.split()
-
-
-            if 'MODEL' in entry:
-                frame += 1
-
-                inModel = True
-
-            elif 'CHROM' in entry:
-
-                subtype = line[16:18]
-
-                types.append(subtype)
-                x.append(float(line[40:48]))
-                y.append(float(line[49:57]))
-                z.append(float(line[58:66]))
-
-            elif 'ENDMDL' in entry:
-                if types_bool:
-                    typelist = [Type_conversion[x] for x in types]
-                    cndbf['types'] = typelist
-                    types_bool = False
-
-                positions = np.vstack([x,y,z]).T
-                cndbf[str(frame)] = positions
-                x = []
-                y = []
-                z = []
-
-            elif 'LOOPS' in entry:
-                loop_list.append([int(info[1]), int(info[2])])
-                loop += 1
+        # each model ends at an ENDMDL record, or at the bare END closing the single model written by MiChroM.saveStructure
+        for model in ndb.split(b'\nEND')[:-1]:
+            buf = np.frombuffer(model, dtype=np.uint8)
+            ends = np.append(np.flatnonzero(buf == ord('\n')), len(buf))
+            starts = np.append(0, ends[:-1] + 1)
+
+            # CHROM records are found and cut out with array operations instead of a loop over the lines
+            chrom = starts[(ends - starts >= 66)]
+            for k, c in enumerate(b'CHROM'):
+                chrom = chrom[buf[chrom + k] == c]
+            if len(chrom) == 0:
+                continue
+
+            if frame == 0:
+                types = buf[chrom[:, None] + np.arange(16, 18)].tobytes()
+                cndbf['types'] = [Type_conversion[types[k:k+2].decode()] for k in range(0, len(types), 2)]
+
+            # x, y and z are in the fixed-width columns 40-47, 49-56 and 58-65; the whole frame is parsed by a single np.loadtxt call
+            cols = buf[chrom[:, None] + np.arange(40, 67)]
+            cols[:, [8, 17]] = ord(' ')
+            cols[:, 26] = ord('\n')
+            positions = np.loadtxt(io.BytesIO(cols.tobytes()), ndmin=2)
+
+            # one chunk per frame, matching the frame-wise reads of xyz()
+            frame += 1
+            cndbf.create_dataset(str(frame), data=positions.astype(np.float32),
+                                 chunks=positions.shape, compression='lzf', shuffle=True)
         
-        if loop > 0:
+        loop_list = []
+        start = ndb.find(b'LOOPS')
+        while start != -1:
+            end = ndb.find(b'\n', start)
+            if start == 0 or ndb[start-1:start] == b'\n':
+                info = ndb[start:end if end != -1 else len(ndb)].split()
+                loop_list.append([int(info[1]), int(info[2])])
+            start = ndb.find(b'LOOPS', start + 5)
+        if len(loop_list) > 0:
             cndbf['loops'] = loop_list
 
         cndbf.close()
@@ -142,19 +212,59 @@ class cndbTools:
         Returns:
             (:math:`N_{frames}`, :math:`N_{beads}`, 3) :class:`numpy.ndarray`: Returns an array of the 3D position of the selected beads for different frames.
         """
-        frame_list = []
-        
-        if beadSelection == None:
-            selection = np.arange(self.Nbeads)
+        if beadSelection is None:
+            selection = np.arange(self.Nbeads, dtype=np.intp)
         else:
-            selection = np.array(beadSelection)
+            selection = np.asarray(beadSelection, dtype=np.intp)
+            if np.any((selection < -self.Nbeads) | (selection >= self.Nbeads)):
+                raise IndexError("beadSelection is out of bounds for {:} beads".format(self.Nbeads))
+            selection = selection % self.Nbeads
+        axes = np.asarray(XYZ, dtype=np.intp)
+        ix = np.ix_(selection, axes)
             
-        if frames[1] == None:
-            frames[1] = self.Nframes
-        
-        for i in range(frames[0],frames[1],frames[2]):
-            frame_list.append(np.take(np.take(np.array(self.cndb[str(i)]), selection, axis=0), XYZ, axis=1))
-        return(np.array(frame_list))
+        last_frame = self.Nframes if frames[1] is None else frames[1]
+        idx = range(frames[0], last_frame, frames[2])
+        
+        if self._coords is not None:
+            if len(idx) > 0 and (min(idx[0], idx[-1]) < 1 or max(idx[0], idx[-1]) > self.Nframes):
+                raise KeyError("Frames {:} to {:} are outside the {:} frames stored in 'coords'".format(idx[0], idx[-1], self.Nframes))
+            # h5py only reads ascending hyperslabs: a negative step reads the same frames in ascending order,
+            # and the buffer is reversed afterwards
+            if len(idx) > 0:
+                frame_slice = slice(min(idx[0], idx[-1])-1, max(idx[0], idx[-1]), abs(idx.step))
+            order = slice(None, None, -1) if idx.step < 0 else slice(None)
+
+            # sparse, sorted selections made of a few contiguous runs read only the selected rows, one hyperslab per run.
+            # This only pays off when the chunks split the bead axis: otherwise every run re-reads (and decompresses)
+            # the whole chunk of each frame, and a single full read is much faster
+            breaks = np.flatnonzero(np.diff(selection) != 1) + 1
+            bead_chunked = self._coords.chunks is not None and self._coords.chunks[1] < self.Nbeads
+            if (bead_chunked and 0 < len(selection) < self.Nbeads/4 and len(breaks) < 8
+                    and np.all(np.diff(selection) > 0)):
+                buf = np.empty((len(idx), len(selection), 3), dtype=self._coords.dtype)
+                if len(idx) > 0:
+                    for r0, r1 in zip(np.r_[0, breaks], np.r_[breaks, len(selection)]):
+                        self._coords.read_direct(buf, np.s_[frame_slice, selection[r0]:selection[r1-1]+1, :], np.s_[:, r0:r1, :])
+                return(buf[order][:, :, axes])
+
+            buf = np.empty((len(idx), self.Nbeads, 3), dtype=self._coords.dtype)
+            if len(idx) > 0:
+                self._coords.read_direct(buf, np.s_[frame_slice, :, :])
+            return(buf[order][:, ix[0], ix[1]])
+
+        # frame datasets are looked up the first time they are requested and reused by later calls;
+        # a frame missing from the file raises KeyError
+        for i in idx:
+            if i not in self._frame_ds:
+                self._frame_ds[i] = self.cndb[str(i)]
+
+        tmp = np.empty((self.Nbeads, 3), dtype=self._frame_dtype)
+        out = np.empty((len(idx), len(selection), len(axes)), dtype=self._frame_dtype)
+        
+        for k, i in enumerate(idx):
+            self._frame_ds[i].read_direct(tmp)
+            out[k] = tmp[ix]
+        return(out)
     
     
     
@@ -302,10 +412,7 @@ class cndbTools:
             :class:`numpy.ndarray` (dim: Tx1):
                 Returns the Radius of Gyration in units of :math:`\sigma`.
         """
-        rcm=np.mean(xyz, axis=1,keepdims=True)
-        xyz_rel_to_cm= xyz - np.tile(rcm,(xyz.shape[1],1))
-        rg=np.sqrt(np.mean(np.linalg.norm(xyz_rel_to_cm,axis=2)**2,axis=1))
-        return rg
+        return np.sqrt(np.asarray(xyz).var(axis=1).sum(axis=1))
 
     def compute_GyrTensorEigs(self, xyz):
         R"""
@@ -469,59 +576,39 @@ class cndbTools:
                 Number of slices to be considered as spherical shells. (Default value = 200).
                        
         Returns:
-            :math:`(N, 1)` :class:`numpy.ndarray`:
-                Returns the radius of each spherical shell in units of :math:`\sigma`.
-            :math:`(N, 1)` :class:`numpy.ndarray`:
+            :math:`(bins,)` :class:`numpy.ndarray`:
+                Returns the radius at the center of each spherical shell in units of :math:`\sigma`.
+            :math:`(bins,)` :class:`numpy.ndarray`:
                 Returns the RDP - Radial Distribution Probability for each spherical shell.
         """
         
-        def calcDist(a,b):
-            R"""
-            Internal function that calculates the distance between two beads. 
-            """
-            return np.sqrt( (a[0] - b[0])**2 + (a[1] - b[1])**2 + (a[2] - b[2])**2  )
-        
-        def calc_gr(ref, pos, R, dr):
-            R"""
-            Internal function that calculates the distance RDP - Radial Distribution Probability. 
-            """
-            g_r =  np.zeros(int(R/dr))
-            dd = []
-            for i in range(len(pos)):
-                dd.append(calcDist(pos[i],ref))
-            raddi =dr
-            k = 0
-            while (raddi <= R):
-                for i in range(0,len(pos)):
-                    if (dd[i] >= raddi and dd[i] < raddi+dr):
-                        g_r[k] += 1
-
-                g_r[k] = g_r[k]/(4*np.pi*dr*raddi**2)
-                raddi += dr
-                k += 1
-            return g_r 
-        
         R_nucleus = radius
         deltaR = R_nucleus/bins                  
    
         n_frames = 0 
-        g_rdf = np.zeros(bins)
+        counts = np.zeros(bins, dtype=np.int64)
  
         for i in range(len(xyz)):
             frame = xyz[i]
-            centroide = np.mean(frame, axis=0)[None,:][0]
+            centroide = np.mean(frame, axis=0)
+            pos = frame if beadSelection is None else frame[beadSelection]
+            d = np.linalg.norm(pos - centroide, axis=1)
+            h, _ = np.histogram(d, bins=bins, range=(0.0, R_nucleus))
+            counts += h
             n_frames += 1
-            g_rdf += calc_gr(centroide, frame[beadSelection], R_nucleus, deltaR)
         
-        Rx = []   
-        for i in np.arange(0, int(R_nucleus+deltaR), deltaR):
-            Rx.append(i)
-        return(Rx, g_rdf/n_frames) 
+        # raw counts of all frames are normalized once by the volume of each shell
+        Rx = (np.arange(bins) + 0.5)*deltaR
+        shell_vol = 4*np.pi*Rx**2*deltaR
+        g_rdf = counts/(n_frames*shell_vol)
+        return(Rx, g_rdf) 
 
-    def traj2HiC(self, xyz, mu=3.22, rc = 1.78):
+    def traj2HiC(self, xyz, mu=3.22, rc = 1.78, batch_size=32, use_gpu=False, n_jobs=1, verbose=False):
         R"""
         Calculates the *in silico* Hi-C maps (contact probability matrix) using a chromatin dyamics trajectory.   
         
+        With :code:`use_gpu=True`, the batched calculation is performed on the GPU using `CuPy <https://cupy.dev/>`__. Else, if `Numba <https://numba.pydata.org/>`__ is installed, the contacts of all frames are accumulated by a compiled parallel kernel, and :code:`batch_size`, :code:`n_jobs` and :code:`verbose` have no effect; the number of threads is set by Numba (e.g. the :code:`NUMBA_NUM_THREADS` environment variable). Otherwise, the frames are processed in batches, with the pairwise distances of each batch obtained from a single batched matrix product.
+        
         The parameters :math:`\mu` (mu) and rc are part of the probability of crosslink function :math:`f(r_{i,j}) = \frac{1}{2}\left( 1 + tanh\left[\mu(r_c - r_{i,j}\right] \right)`, where :math:`r_{i,j}` is the spatial distance between loci (beads) *i* and *j*.
         
         Args:
@@ -530,26 +617,134 @@ class cndbTools:
                 Parameter in the probability of crosslink function. (Default value = 3.22).
             rc (float, required):
                 Parameter in the probability of crosslink function, :math:`f(rc) = 0.5`. (Default value = 1.78).
+            batch_size (int, required):
+                Maximum number of frames processed together on the GPU or when Numba is not available. The batch is reduced for large numbers of beads to bound memory usage. (Default value = 32).
+            use_gpu (bool, required):
+                Whether to compute the contact probability matrix on the GPU. Requires CuPy. (Default value = False).
+            n_jobs (int, required):
+                Number of threads processing batches concurrently when neither the GPU nor Numba is used. (Default value = 1).
+            verbose (bool, required):
+                Whether to print the progress every 500 frames when neither the GPU nor Numba is used. (Default value = False).
         
          Returns:
             :math:`(N, N)` :class:`numpy.ndarray`:
-                Returns the *in silico* Hi-C maps (contact probability matrix).
+                Returns the *in silico* Hi-C maps (contact probability matrix) in single precision.
         """
-        def calc_prob(data, mu, rc):
-            return 0.5 * (1.0 + np.tanh(mu * (rc - distance.cdist(data, data, 'euclidean'))))
+        if use_gpu and not _HAS_CUPY:
+            raise ImportError("CuPy is required to compute the contact probability matrix with use_gpu=True.")
+
+        # contact probabilities only need ~1e-4 precision, so everything is done in float32;
+        # centering each frame reduces the cancellation error of the squared-distance identity
+        xyz = np.asarray(xyz, dtype=np.float32)
+        xyz = xyz - xyz.mean(axis=1, keepdims=True)
+        mu, rc = np.float32(mu), np.float32(rc)
+        Ntotal, size = xyz.shape[0], xyz.shape[1]
+        
+        # keeps the (K, N, N) batches of squared distances of all threads around 64 MB
+        n_jobs = max(1, n_jobs)
+        batch_size = max(1, min(batch_size, 2**24//(n_jobs*size**2)))
+
+        if use_gpu:
+            P_gpu = cp.zeros((size, size), dtype=cp.float32)
+            for i in range(0, Ntotal, batch_size):
+                xyz_k = cp.asarray(xyz[i:i+batch_size])
+                sq = (xyz_k**2).sum(-1)
+                d2 = sq[:,:,None] + sq[:,None,:] - 2*cp.matmul(xyz_k, xyz_k.transpose(0,2,1))
+                P_gpu += (0.5 * (1.0 + cp.tanh(mu * (rc - cp.sqrt(cp.maximum(d2, 0.0)))))).sum(0)
+            P = cp.asnumpy(P_gpu/Ntotal)
+            np.fill_diagonal(P, 0.5 * (1.0 + np.tanh(mu * rc)))
+            return(P)
+
+        if _HAS_NUMBA:
+            P = np.zeros((size, size), dtype=np.float32)
+            _accum_contact(np.ascontiguousarray(xyz), P, mu, rc)
+            P /= Ntotal
+            np.fill_diagonal(P, 0.5 * (1.0 + np.tanh(mu * rc)))
+            return(P)
+
+        iu, ju = np.triu_indices(size, k=1)
+        upper = iu*size + ju
+
+        def accum_tanh(starts):
+            R"""
+            Internal function that sums the tanh term over the batches beginning at :code:`starts`.
+            """
+            T_cond = np.zeros(len(upper), dtype=np.float32)
+            scratch = np.empty((batch_size, len(upper)), dtype=np.float32)
+            for i in starts:
+                buf = self._upper_sq_dist(xyz[i:i+batch_size], upper, scratch)
+                np.sqrt(buf, out=buf)
+                np.subtract(rc, buf, out=buf)
+                buf *= mu
+                np.tanh(buf, out=buf)
+                T_cond += buf.sum(0)
+                if verbose and i % 500 < batch_size:
+                    print("Reading frame {:} of {:}".format(i, Ntotal))
+            return T_cond
+
+        # NumPy releases the GIL inside matmul, take and the ufuncs, so threads run the batches concurrently
+        starts = range(0, Ntotal, batch_size)
+        if n_jobs > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                T_cond = sum(pool.map(accum_tanh, [starts[w::n_jobs] for w in range(n_jobs)]))
+        else:
+            T_cond = accum_tanh(starts)
         
-        size = len(xyz[0])
-        P = np.zeros((size, size))
-        Ntotal = 0
+        # sum over frames of 0.5*(1 + tanh) is 0.5*(Ntotal + sum of tanh)
+        P = distance.squareform(0.5 * (1.0 + T_cond/Ntotal))
+        np.fill_diagonal(P, 0.5 * (1.0 + np.tanh(mu * rc)))
+        return(P)    
+
+    def traj2HiC_hard(self, xyz, rc=1.78, batch_size=32):
+        R"""
+        Calculates the *in silico* Hi-C maps (contact probability matrix) using a chromatin dyamics trajectory, counting a contact between loci (beads) *i* and *j* whenever :math:`r_{i,j} < r_c`.
         
-        for i in range(len(xyz)):
-            data = xyz[i]
-            P += calc_prob(data, mu, rc)
-            Ntotal += 1
-            if i % 500 == 0:
-                print("Reading frame {:} of {:}".format(i, len(xyz)))
+        This is the step function limit (:math:`\mu \to \infty`) of the probability of crosslink function used in :code:`traj2HiC()`. Squared distances are compared against :math:`r_c^2` and the contacts are counted in 16-bit integers (32-bit for 65536 frames or more), so no square roots or tanh are evaluated.
+        
+        Args:
+            xyz (:math:`(frames, beadSelection, XYZ)` :class:`numpy.ndarray`, required):
+                Array of the 3D position of the selected beads for different frames extracted by using the :code: `xyz()` function.
+            rc (float, required):
+                Contact cutoff distance in units of :math:`\sigma`. (Default value = 1.78).
+            batch_size (int, required):
+                Maximum number of frames processed together. The batch is reduced for large numbers of beads to bound memory usage. (Default value = 32).
         
-        return(np.divide(P , Ntotal))    
+        Returns:
+            :math:`(N, N)` :class:`numpy.ndarray`:
+                Returns the *in silico* Hi-C maps (contact probability matrix) in single precision.
+        """
+        xyz = np.asarray(xyz, dtype=np.float32)
+        xyz = xyz - xyz.mean(axis=1, keepdims=True)
+        Ntotal, size = xyz.shape[0], xyz.shape[1]
+        batch_size = max(1, min(batch_size, 2**24//size**2))
+        rc2 = np.float32(rc)**2
+
+        iu, ju = np.triu_indices(size, k=1)
+        upper = iu*size + ju
+        counts = np.zeros(len(upper), dtype=np.uint16 if Ntotal < 2**16 else np.uint32)
+        scratch = np.empty((batch_size, len(upper)), dtype=np.float32)
+
+        for i in range(0, Ntotal, batch_size):
+            buf = self._upper_sq_dist(xyz[i:i+batch_size], upper, scratch)
+            counts += np.less(buf, rc2).sum(0, dtype=counts.dtype)
+
+        P = distance.squareform(counts.astype(np.float32)/Ntotal)
+        np.fill_diagonal(P, 1.0)
+        return(P)
+
+    def _upper_sq_dist(self, xyz_k, upper, scratch):
+        R"""
+        Internal function that returns the squared distances of the pairs with flat indices :code:`upper` for a batch of frames, written into :code:`scratch`.
+        """
+        sq = (xyz_k**2).sum(-1)
+        d2 = np.matmul(xyz_k, xyz_k.transpose(0,2,1))
+        d2 *= -2.0
+        d2 += sq[:,:,None]
+        d2 += sq[:,None,:]
+        buf = scratch[:len(xyz_k)]
+        np.take(d2.reshape(len(xyz_k), -1), upper, axis=1, out=buf)
+        np.maximum(buf, 0.0, out=buf)
+        return buf
             
         
     def __repr__(self):
@@ -10,6 +10,7 @@ from Analyze import Ana
 import h5py
 import numpy as np
 import pandas as pd
+from scipy.spatial import distance
 
 
 
@@ -78,7 +79,39 @@ class testMichrom():
         print("Generating the contact probability matrix...")
         alldata = cndbt.xyz()
         dense = cndbt.traj2HiC(alldata)
+        dense_hard = cndbt.traj2HiC_hard(alldata)
+
+        print("Comparing the contact probability matrix of an XY projection with cdist...")
+        xy = cndbt.xyz(frames=[1,11,1], XYZ=[0,1])
+        dense_xy = cndbt.traj2HiC(xy)
+        reference_xy = np.mean([0.5*(1.0 + np.tanh(3.22*(1.78 - distance.cdist(frame, frame)))) for frame in xy], axis=0)
+        assert(np.abs(dense_xy - reference_xy).max() < 1e-4)
+        
+        print('Finished')
+
+    def testCndbCoordsLayout(self):
+        perframe = cndbTools().load(filename=sys.path[0] + '/training/test_0.cndb')
+        
+        filename = sys.path[0] + '/output/test_0_coords.cndb'
+        with h5py.File(filename, 'w') as f:
+            f['types'] = perframe.cndb['types'][()]
+            f.create_dataset('coords', data=perframe.xyz(frames=[1,perframe.Nframes+1,1]), chunks=(10,64,3), compression='lzf')
+        coords = cndbTools().load(filename=filename)
+        assert(coords.Nframes == perframe.Nframes)
         
+        print("Comparing 'coords' and per-frame layouts...")
+        for kwargs in [dict(), 
+                       dict(frames=[3,90,7], beadSelection=[5,2,9], XYZ=[2,0]),
+                       dict(frames=[2,50,3], beadSelection=np.arange(100,300)),
+                       dict(frames=[1,20,1], beadSelection=[10,11,12,40,41,-3,-2,-1]),
+                       dict(frames=[1,20,1], beadSelection=np.arange(0,1561,5)),
+                       dict(frames=[1,20,1], beadSelection=perframe.dictChromSeq['NA']),
+                       dict(frames=[10,1,-1]),
+                       dict(frames=[50,2,-3], beadSelection=np.arange(100,300)),
+                       dict(frames=[5,5,1])]:
+            a = perframe.xyz(**kwargs)
+            b = coords.xyz(**kwargs)
+            assert(a.dtype == b.dtype and np.array_equal(a, b))
         print('Finished')
         
     def testAdamTraining(self):
@@ -102,4 +135,5 @@ run = testMichrom()
 run.runDefault()
 run.testCustomMiChroM()
 run.testCndbTools()
+run.testCndbCoordsLayout()
 run.testAdamTraining()